@@ -0,0 +1,46 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from . import metrics
+from .catalog import cache_version
+
+_tokens = OrderedDict()
+_lock = threading.Lock()
+
+
+def forget_token(key):
+    with _lock:
+        _tokens.pop(key, None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        version = cache_version('tokens')
+        now = time.monotonic()
+        with _lock:
+            cached = _tokens.get(key)
+            hit = (
+                cached is not None and cached[0] == version
+                and cached[1] > now
+            )
+            if hit:
+                _tokens.move_to_end(key)
+        metrics.cache_result('tokens', hit)
+        if not hit:
+            user, token = super().authenticate_credentials(key)
+            cached = (
+                version, now + settings.TOKEN_CACHE_TIMEOUT, user, token
+            )
+            with _lock:
+                _tokens[key] = cached
+                _tokens.move_to_end(key)
+                while len(_tokens) > settings.TOKEN_CACHE_SIZE:
+                    _tokens.popitem(last=False)
+        return copy.copy(cached[2]), cached[3]
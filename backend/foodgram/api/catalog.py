@@ -0,0 +1,63 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from . import metrics
+
+_catalogs = {}
+
+
+def cache_version(name):
+    key = f'cache-version:{name}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(name):
+    cache.set(f'cache-version:{name}', uuid4().hex, timeout=None)
+
+
+def is_fresh(stored_at):
+    return (
+        settings.SHARED_CACHE
+        or time.monotonic() - stored_at < settings.CATALOG_LOCAL_TIMEOUT
+    )
+
+
+class CachedCatalogMixin:
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or not isinstance(
+            request.accepted_renderer, JSONRenderer
+        ):
+            return super().list(request, *args, **kwargs)
+        version = cache_version(self.catalog_name)
+        cached = _catalogs.get(self.catalog_name)
+        hit = (
+            cached is not None and cached[0] == version
+            and is_fresh(cached[1])
+        )
+        metrics.cache_result(self.catalog_name, hit)
+        if not hit:
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            content = JSONRenderer().render(serializer.data)
+            etag = quote_etag(hashlib.md5(content).hexdigest())
+            cached = _catalogs[self.catalog_name] = (
+                version, time.monotonic(), etag, content
+            )
+        _, _, etag, content = cached
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
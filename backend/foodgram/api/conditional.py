@@ -0,0 +1,69 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import quote_etag
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription, User
+
+from .catalog import bump_cache_version, cache_version
+
+USER_RELATIONS = (Favorite, ShoppingCart, Subscription)
+RECIPE_CACHE_VERSIONS = ('recipes', 'tags', 'ingredients', 'users')
+
+
+def popularity_changed():
+    transaction.on_commit(lambda: bump_cache_version('popularity'))
+
+
+def recipe_versions(request, names=RECIPE_CACHE_VERSIONS):
+    if any(
+        'popularity' in value
+        for value in request.query_params.getlist('ordering')
+    ):
+        names += ('popularity',)
+    return [cache_version(name) for name in names]
+
+
+def user_state(user):
+    if user.is_anonymous:
+        return None
+    annotations = {}
+    for model in USER_RELATIONS:
+        rows = model.objects.filter(
+            user=OuterRef('pk')
+        ).order_by().values('user')
+        name = model._meta.model_name
+        annotations[f'{name}_count'] = Subquery(
+            rows.annotate(value=Count('pk')).values('value')
+        )
+        annotations[f'{name}_last'] = Subquery(
+            rows.annotate(value=Max('pk')).values('value')
+        )
+    return User.objects.filter(pk=user.pk).annotate(
+        **annotations
+    ).values_list(*annotations).first()
+
+
+def recipes_etag(request, recipes_state):
+    state = (
+        request.get_full_path(),
+        request.user.pk,
+        user_state(request.user),
+        cache_version('tags'),
+        cache_version('ingredients'),
+        cache_version('users'),
+        recipes_state,
+    )
+    return quote_etag(hashlib.md5(repr(state).encode()).hexdigest())
+
+
+def anonymous_cache_key(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    state = (request.path, params, recipe_versions(request))
+    return 'anonymous:' + hashlib.md5(repr(state).encode()).hexdigest()
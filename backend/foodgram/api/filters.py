@@ -1,41 +1,119 @@
+import time
+
+from django.conf import settings
+from django.db.models import Case, Exists, IntegerField, OuterRef, When
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from django_filters.constants import EMPTY_VALUES
+from rest_framework.filters import BaseFilterBackend
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+
+from . import metrics
+from .catalog import cache_version, is_fresh
+
+_tag_ids = {}
+
+
+def get_tag_ids():
+    version = cache_version('tags')
+    cached = _tag_ids.get(version)
+    hit = cached is not None and is_fresh(cached[0])
+    metrics.cache_result('tag_ids', hit)
+    if not hit:
+        cached = (time.monotonic(), dict(
+            Tag.objects.values_list('slug', 'id')
+        ))
+        _tag_ids.clear()
+        _tag_ids[version] = cached
+    return cached[1]
+
 
-from recipes.models import Ingredient, Recipe, Tag
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
 
 
-class NameFilter(SearchFilter):
+class NameFilter(BaseFilterBackend):
     search_param = 'name'
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '')
+        name = name.strip().lower()
+        if not name:
+            return queryset
+        matches = queryset.filter(search_name__contains=name)
+        if getattr(view, 'action', None) == 'list':
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+            prefixed = queryset.filter(search_name__startswith=name)
+            ids = list(prefixed.order_by('search_name').values_list(
+                'pk', flat=True
+            )[:limit])
+            if len(ids) < limit:
+                ids += matches.exclude(
+                    search_name__startswith=name
+                ).order_by('search_name').values_list(
+                    'pk', flat=True
+                )[:limit - len(ids)]
+            matches = queryset.filter(pk__in=ids)
+        return matches.annotate(
+            search_rank=Case(
+                When(search_name__startswith=name, then=0),
+                default=1,
+                output_field=IntegerField()
+            )
+        ).order_by('search_rank', 'search_name')
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        return qs.order_by(*ordering, '-pub_date', '-id')
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags',
     )
-    author = filters.CharFilter(field_name='author__username')
+    author = filters.NumberFilter(field_name='author_id')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = RecipeOrderingFilter(
+        fields=(
+            ('favorites_count', 'popularity'),
+            ('pub_date', 'pub_date'),
+        )
+    )
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'ordering'
+        ]
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value]
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
-        if user.is_authenticated:
-            return queryset.filter(favorite__user=user)
+        if value and user.is_authenticated:
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
 
-    def filter_is_in_shopping_cart(self, queryset, name, alue):
+    def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
-        if user.is_authenticated:
-            return queryset.filter(in_carts__user=user)
+        if value and user.is_authenticated:
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
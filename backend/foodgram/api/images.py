@@ -0,0 +1,63 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from recipes.models import Recipe
+
+from .catalog import bump_cache_version
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='renditions'
+)
+
+
+def build_renditions(image):
+    return {
+        format.lower(): {
+            str(width): get_thumbnail(
+                image, str(width), format=format, upscale=False
+            ).name
+            for width in settings.RECIPE_IMAGE_WIDTHS
+        }
+        for format in settings.RECIPE_IMAGE_FORMATS
+    }
+
+
+def render_recipe_image(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image or not recipe.image.storage.exists(
+        recipe.image.name
+    ):
+        return False
+    renditions = build_renditions(recipe.image)
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_renditions=renditions, updated_at=timezone.now())
+    if updated:
+        bump_cache_version('recipes')
+    return bool(updated)
+
+
+def render_in_background(recipe_id):
+    try:
+        render_recipe_image(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить картинки рецепта %s', recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    recipe_id = recipe.pk
+    transaction.on_commit(
+        lambda: executor.submit(render_in_background, recipe_id)
+    )
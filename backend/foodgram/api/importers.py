@@ -0,0 +1,365 @@
+import csv
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.files import File
+from django.core.management import CommandError
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem, Tag)
+from users.models import User
+
+from .catalog import bump_cache_version
+from .signals import shopping_lists_paused
+
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,['
+
+
+def read_csv(file, fields):
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    if set(header) <= set(fields):
+        fields = header
+    else:
+        yield dict(zip(fields, header))
+    for row in reader:
+        yield dict(zip(fields, row))
+
+
+def read_json(file, fields):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while not eof:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+        position = 0
+        while True:
+            while (
+                position < len(buffer)
+                and buffer[position] in JSON_SEPARATORS
+            ):
+                position += 1
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break
+            yield row
+        buffer = buffer[position:]
+
+
+def read_jsonl(file, fields):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'jsonl': read_jsonl,
+}
+
+
+def load_nested(value):
+    if isinstance(value, str):
+        return json.loads(value) if value else []
+    return value
+
+
+class Importer:
+    fields = ()
+    cache_names = ()
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.created = 0
+        self.updated = 0
+
+    def import_batch(self, rows):
+        raise NotImplementedError
+
+    def finish(self):
+        for name in self.cache_names:
+            bump_cache_version(name)
+
+
+class IngredientImporter(Importer):
+    fields = ('name', 'measurement_unit')
+    cache_names = ('ingredients',)
+
+    def import_batch(self, rows):
+        keys = {
+            (row['name'].strip(), row['measurement_unit'].strip())
+            for row in rows
+        }
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('name', 'measurement_unit'))
+        created = Ingredient.objects.bulk_create([
+            Ingredient(
+                name=name,
+                measurement_unit=measurement_unit,
+                search_name=name.lower()
+            )
+            for name, measurement_unit in keys - existing
+        ])
+        self.created += len(created)
+
+    def finish(self):
+        unindexed = []
+        for ingredient in Ingredient.objects.filter(
+            search_name=''
+        ).only('name').iterator():
+            ingredient.search_name = ingredient.name.lower()
+            unindexed.append(ingredient)
+        Ingredient.objects.bulk_update(
+            unindexed, ('search_name',),
+            batch_size=settings.IMPORT_BATCH_SIZE
+        )
+        self.updated += len(unindexed)
+        super().finish()
+
+
+class TagImporter(Importer):
+    fields = ('name', 'color', 'slug')
+    cache_names = ('tags',)
+
+    def import_batch(self, rows):
+        rows = {row['slug']: row for row in rows}
+        existing = Tag.objects.in_bulk(rows, field_name='slug')
+        new, changed = [], []
+        for slug, row in rows.items():
+            tag = existing.get(slug)
+            if tag is None:
+                new.append(
+                    Tag(name=row['name'], color=row['color'], slug=slug)
+                )
+            elif (tag.name, tag.color) != (row['name'], row['color']):
+                tag.name, tag.color = row['name'], row['color']
+                changed.append(tag)
+        Tag.objects.bulk_create(new)
+        Tag.objects.bulk_update(changed, ('name', 'color'))
+        self.created += len(new)
+        self.updated += len(changed)
+
+
+class UserImporter(Importer):
+    fields = ('email', 'username', 'first_name', 'last_name', 'password')
+    updated_fields = ('username', 'first_name', 'last_name', 'password')
+    cache_names = ('users',)
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.passwords = {}
+
+    def is_hashed(self, password):
+        try:
+            identify_hasher(password)
+        except ValueError:
+            return False
+        return True
+
+    def password(self, password):
+        if not password:
+            return make_password(None)
+        if self.is_hashed(password):
+            return password
+        if password not in self.passwords:
+            self.passwords[password] = make_password(password)
+        return self.passwords[password]
+
+    def import_batch(self, rows):
+        rows = {row['email']: row for row in rows}
+        existing = User.objects.in_bulk(rows, field_name='email')
+        new, changed = [], []
+        for email, row in rows.items():
+            user = existing.get(email)
+            password = row.get('password')
+            if user is None:
+                new.append(User(
+                    email=email,
+                    username=row['username'],
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    password=self.password(password)
+                ))
+                continue
+            values = {
+                'username': row['username'],
+                'first_name': row['first_name'],
+                'last_name': row['last_name'],
+                'password': (
+                    password if password and self.is_hashed(password)
+                    else user.password
+                ),
+            }
+            if any(getattr(user, field) != values[field] for field in values):
+                for field, value in values.items():
+                    setattr(user, field, value)
+                changed.append(user)
+        User.objects.bulk_create(new)
+        User.objects.bulk_update(changed, self.updated_fields)
+        self.created += len(new)
+        self.updated += len(changed)
+
+
+class RecipeImporter(Importer):
+    fields = (
+        'author', 'name', 'text', 'cooking_time', 'image', 'tags',
+        'ingredients',
+    )
+    updated_fields = (
+        'text', 'cooking_time', 'image', 'image_renditions', 'updated_at',
+    )
+    cache_names = ('recipes', 'users')
+
+    def recipes_by_key(self, keys, queryset=Recipe.objects.all()):
+        recipes = {}
+        for recipe in queryset.filter(
+            author__in={author for author, _ in keys},
+            name__in={name for _, name in keys}
+        ).order_by('-id'):
+            recipes[recipe.author_id, recipe.name] = recipe
+        return recipes
+
+    def set_image(self, recipe, image):
+        name = recipe.image.name
+        path = os.path.join(self.directory, image)
+        with open(path, 'rb') as file:
+            recipe.image.save(os.path.basename(path), File(file), save=False)
+        if recipe.image.name != name:
+            recipe.image_renditions = {}
+
+    def amounts(self, name, row, ingredients):
+        amounts = defaultdict(int)
+        for item in row['ingredients']:
+            ingredient = (item['name'], item['measurement_unit'])
+            if ingredient not in ingredients:
+                raise CommandError(
+                    f'Не найден ингредиент {ingredient} для рецепта «{name}».'
+                )
+            amounts[ingredients[ingredient]] += int(item['amount'])
+        return dict(amounts)
+
+    def tag_ids(self, row, tags):
+        for slug in row['tags']:
+            if slug not in tags:
+                raise CommandError(f'Не найден тег «{slug}».')
+        return {tags[slug].pk for slug in row['tags']}
+
+    def state(self, recipe, amounts=None, tag_ids=None):
+        if amounts is None:
+            amounts = {
+                item.ingredient_id: item.amount
+                for item in recipe.recipeingredient.all()
+            }
+            tag_ids = {tag.pk for tag in recipe.tags.all()}
+        return (
+            recipe.text, recipe.cooking_time, recipe.image.name, amounts,
+            tag_ids,
+        )
+
+    def import_batch(self, rows):
+        authors = User.objects.in_bulk(
+            {row['author'] for row in rows}, field_name='email'
+        )
+        missing = {row['author'] for row in rows} - authors.keys()
+        if missing:
+            raise CommandError(
+                f'Не найдены авторы: {", ".join(sorted(missing))}.'
+            )
+        for row in rows:
+            row['tags'] = load_nested(row.get('tags'))
+            row['ingredients'] = load_nested(row.get('ingredients'))
+        tags = Tag.objects.in_bulk(
+            {slug for row in rows for slug in row['tags']}, field_name='slug'
+        )
+        ingredients = {}
+        for pk, name, measurement_unit in Ingredient.objects.filter(
+            name__in={
+                item['name'] for row in rows for item in row['ingredients']
+            }
+        ).order_by('-id').values_list('id', 'name', 'measurement_unit'):
+            ingredients[name, measurement_unit] = pk
+        rows = {(authors[row['author']].pk, row['name']): row for row in rows}
+        existing = self.recipes_by_key(
+            rows, Recipe.objects.prefetch_related('recipeingredient', 'tags')
+        )
+        new, changed, links = [], [], {}
+        for key, row in rows.items():
+            amounts = self.amounts(key[1], row, ingredients)
+            tag_ids = self.tag_ids(row, tags)
+            recipe = existing.get(key)
+            if recipe is None:
+                recipe = Recipe(author_id=key[0], name=key[1])
+                new.append(recipe)
+            else:
+                state = self.state(recipe)
+            recipe.text = row['text']
+            recipe.cooking_time = int(row['cooking_time'])
+            if row.get('image'):
+                self.set_image(recipe, row['image'])
+            if recipe.pk is not None:
+                if state == self.state(recipe, amounts, tag_ids):
+                    continue
+                recipe.updated_at = timezone.now()
+                changed.append(recipe)
+            links[key] = (amounts, tag_ids)
+        Recipe.objects.bulk_create(new)
+        Recipe.objects.bulk_update(changed, self.updated_fields)
+        changed_ids = [recipe.pk for recipe in changed]
+        with shopping_lists_paused():
+            RecipeIngredient.objects.filter(recipe__in=changed_ids).delete()
+        Recipe.tags.through.objects.filter(recipe__in=changed_ids).delete()
+        recipes = self.recipes_by_key(links) if links else {}
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipes[key], ingredient_id=ingredient, amount=amount
+            )
+            for key, (amounts, _) in links.items()
+            for ingredient, amount in amounts.items()
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipes[key].pk, tag_id=tag_id)
+            for key, (_, tag_ids) in links.items()
+            for tag_id in tag_ids
+        )
+        added = defaultdict(list)
+        for author, count in Counter(
+            recipe.author_id for recipe in new
+        ).items():
+            added[count].append(author)
+        for count, author_ids in added.items():
+            User.objects.filter(pk__in=author_ids).update(
+                recipes_count=F('recipes_count') + count
+            )
+        if changed_ids:
+            ShoppingListItem.objects.rebuild(
+                ShoppingCart.objects.filter(
+                    recipe__in=changed_ids
+                ).values_list('user_id', flat=True).distinct()
+            )
+        self.created += len(new)
+        self.updated += len(changed)
+
+
+IMPORTERS = {
+    'ingredients': IngredientImporter,
+    'tags': TagImporter,
+    'users': UserImporter,
+    'recipes': RecipeImporter,
+}
@@ -0,0 +1,176 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.pagination import CustomPagination
+from recipes.models import Recipe, Tag
+from users.models import User
+
+from .generate_data import EMAIL_DOMAIN
+
+PAGE_SIZE = CustomPagination.page_size
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число запросов к базе и выделенную память '
+        'для основных ручек API через тестовый клиент Django.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на каждый сценарий.')
+        parser.add_argument('--email', default=f'user0@{EMAIL_DOMAIN}',
+                            help='Пользователь для авторизованных сценариев.')
+        parser.add_argument('--only', nargs='*',
+                            help='Запустить только перечисленные сценарии.')
+        parser.add_argument('--save', help='Сохранить результаты в JSON.')
+        parser.add_argument('--compare',
+                            help='Сравнить с ранее сохранённым JSON.')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Допустимое ухудшение медианы задержки, %%.'
+        )
+
+    def scenarios(self, user):
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        if recipe is None:
+            raise CommandError('Нет рецептов; запустите generate_data.')
+        tag_query = '&'.join(f'tags={slug}' for slug in tags)
+        deep_page = min(100, -(-Recipe.objects.count() // PAGE_SIZE))
+        return {
+            'recipes_list_anonymous': ('/api/recipes/', False),
+            'recipes_list': ('/api/recipes/', True),
+            'recipes_list_deep_page': (
+                f'/api/recipes/?page={deep_page}', True
+            ),
+            'recipes_list_tags': (f'/api/recipes/?{tag_query}', True),
+            'recipes_list_author': (
+                f'/api/recipes/?author={recipe.author_id}', True
+            ),
+            'recipes_list_favorited': ('/api/recipes/?is_favorited=1', True),
+            'recipes_list_in_cart': (
+                '/api/recipes/?is_in_shopping_cart=1', True
+            ),
+            'recipe_detail': (f'/api/recipes/{recipe.pk}/', True),
+            'subscriptions': (
+                '/api/users/subscriptions/?recipes_limit=3', True
+            ),
+            'download_shopping_cart': (
+                '/api/recipes/download_shopping_cart/', True
+            ),
+            'ingredients_search': ('/api/ingredients/?name=са', False),
+            'users_me': ('/api/users/me/', True),
+        }
+
+    def request(self, client, path, headers):
+        response = client.get(path, **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: ответ {response.status_code}.')
+        return response
+
+    def measure(self, path, headers, count):
+        client = Client()
+        self.request(client, path, headers)
+        timings, queries = [], []
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                self.request(client, path, headers)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+        tracemalloc.start()
+        self.request(client, path, headers)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p90_ms': round(percentile(timings, 0.9), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': max(queries),
+            'peak_memory_kib': round(peak / 1024, 1),
+        }
+
+    def handle(self, *args, **kwargs):
+        user = User.objects.filter(email=kwargs['email']).first()
+        if user is None:
+            raise CommandError(
+                f'Пользователь {kwargs["email"]} не найден; '
+                f'запустите generate_data или передайте --email.'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        scenarios = self.scenarios(user)
+        if kwargs['only']:
+            unknown = set(kwargs['only']) - scenarios.keys()
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}.'
+                )
+            scenarios = {
+                name: scenarios[name] for name in kwargs['only']
+            }
+        results = {}
+        self.stdout.write(
+            f'{"сценарий":<28}{"p50":>9}{"p90":>9}{"p99":>9}'
+            f'{"запросы":>9}{"КиБ":>10}'
+        )
+        for name, (path, authorized) in scenarios.items():
+            headers = (
+                {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+                if authorized else {}
+            )
+            result = results[name] = self.measure(
+                path, headers, kwargs['requests']
+            )
+            self.stdout.write(
+                f'{name:<28}{result["p50_ms"]:>9}{result["p90_ms"]:>9}'
+                f'{result["p99_ms"]:>9}{result["queries"]:>9}'
+                f'{result["peak_memory_kib"]:>10}'
+            )
+        if kwargs['save']:
+            with open(kwargs['save'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+        if kwargs['compare']:
+            self.compare(results, kwargs['compare'], kwargs['threshold'])
+
+    def compare(self, results, path, threshold):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            change = (
+                (result['p50_ms'] - before['p50_ms'])
+                / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            )
+            self.stdout.write(
+                f'{name:<28}p50 {change:+.0f}%, запросы '
+                f'{before["queries"]} → {result["queries"]}'
+            )
+            if change > threshold or result['queries'] > before['queries']:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(
+                f'Ухудшение относительно {path}: {", ".join(regressions)}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Ухудшений нет.'))
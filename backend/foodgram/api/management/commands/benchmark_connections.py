@@ -0,0 +1,107 @@
+import threading
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+
+from api import metrics
+from foodgram.db.pool import close_pool
+
+MODES = {
+    'no_persistence': {'CONN_MAX_AGE': 0, 'POOL_SIZE': 0},
+    'persistent': {'CONN_MAX_AGE': 60, 'POOL_SIZE': 0},
+    'pool': {'CONN_MAX_AGE': 0, 'POOL_SIZE': None},
+}
+
+
+def opened_connections():
+    return sum(
+        value for name, _, value in metrics.snapshot()
+        if name == 'foodgram_db_connections_total'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность API под параллельной нагрузкой '
+        'без постоянных соединений, с CONN_MAX_AGE и с пулом соединений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый поток.')
+        parser.add_argument('--path', default='/api/ingredients/?name=са')
+        parser.add_argument('--pool-size', type=int, default=None,
+                            help='Размер пула; по умолчанию число потоков.')
+        parser.add_argument('--only', nargs='*', choices=MODES)
+
+    def worker(self, path, count, errors):
+        client = Client()
+        try:
+            for _ in range(count):
+                close_old_connections()
+                response = client.get(path)
+                close_old_connections()
+                if response.status_code != 200:
+                    errors.append(f'{path}: ответ {response.status_code}.')
+                    return
+        finally:
+            connections.close_all()
+
+    def run(self, mode, threads, count, path):
+        settings_dict = connections.databases['default']
+        original = dict(settings_dict)
+        settings_dict.update(mode)
+        if mode['POOL_SIZE']:
+            vendor = original['ENGINE'].rsplit('.', 1)[1]
+            settings_dict['ENGINE'] = f'foodgram.db.{vendor}'
+        errors = []
+        opened = opened_connections()
+        workers = [
+            threading.Thread(target=self.worker, args=(path, count, errors))
+            for _ in range(threads)
+        ]
+        started = time.perf_counter()
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            elapsed = time.perf_counter() - started
+            close_pool('default')
+            settings_dict.clear()
+            settings_dict.update(original)
+        if errors:
+            raise CommandError(errors[0])
+        return {
+            'rps': round(threads * count / elapsed, 1),
+            'connections': int(opened_connections() - opened),
+        }
+
+    def handle(self, *args, **kwargs):
+        connections.close_all()
+        pool_size = kwargs['pool_size'] or kwargs['threads']
+        self.stdout.write(f'{"режим":<18}{"запр./с":>10}{"соединений":>12}')
+        results = {}
+        for name, mode in MODES.items():
+            if kwargs['only'] and name not in kwargs['only']:
+                continue
+            if mode['POOL_SIZE'] is None:
+                mode = {**mode, 'POOL_SIZE': pool_size}
+            result = results[name] = self.run(
+                mode, kwargs['threads'], kwargs['requests'], kwargs['path']
+            )
+            self.stdout.write(
+                f'{name:<18}{result["rps"]:>10}{result["connections"]:>12}'
+            )
+        if 'no_persistence' in results and len(results) > 1:
+            base = results['no_persistence']['rps']
+            for name, result in results.items():
+                if name != 'no_persistence':
+                    self.stdout.write(
+                        f'{name}: {result["rps"] / base:.2f}x '
+                        f'относительно no_persistence'
+                    )
@@ -0,0 +1,58 @@
+import os
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки, на которые не ссылается ни один рецепт, '
+        'вместе с их уменьшенными копиями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24,
+            help='Не трогать файлы моложе указанного числа часов.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать файлы, которые будут удалены.'
+        )
+
+    def walk(self, storage, directory):
+        directories, files = storage.listdir(directory)
+        for name in files:
+            yield os.path.join(directory, name)
+        for name in directories:
+            yield from self.walk(storage, os.path.join(directory, name))
+
+    def handle(self, *args, **kwargs):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        if not storage.exists(field.upload_to):
+            return
+        referenced = set(
+            Recipe.objects.exclude(image='').values_list('image', flat=True)
+        )
+        threshold = timezone.now() - timedelta(hours=kwargs['min_age'])
+        orphans = [
+            name for name in self.walk(storage, field.upload_to)
+            if name not in referenced
+            and storage.get_modified_time(name) < threshold
+        ]
+        if not kwargs['dry_run']:
+            for name in orphans:
+                delete(ImageFile(name, storage))
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых картинок: {len(orphans)}'
+            + (' (не удалены).' if kwargs['dry_run'] else ', удалены.')
+        ))
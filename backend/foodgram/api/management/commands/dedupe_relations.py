@@ -0,0 +1,52 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+
+from recipes.models import Favorite, RecipeIngredient, ShoppingCart
+from users.models import Subscription
+
+RELATIONS = (
+    (Favorite, ('user', 'recipe')),
+    (ShoppingCart, ('user', 'recipe')),
+    (Subscription, ('user', 'author')),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет повторяющиеся связи перед созданием ограничений '
+        'уникальности.'
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **kwargs):
+        for model, fields in RELATIONS:
+            deleted = 0
+            duplicates = model.objects.values(*fields).annotate(
+                first_id=Min('id'), total=Count('id')
+            ).filter(total__gt=1).order_by()
+            for duplicate in duplicates:
+                deleted += model.objects.filter(
+                    **{field: duplicate[field] for field in fields}
+                ).exclude(id=duplicate['first_id']).delete()[0]
+            self.stdout.write(f'{model.__name__}: удалено {deleted}')
+        self_subscriptions = Subscription.objects.filter(
+            user=F('author')
+        ).delete()[0]
+        self.stdout.write(
+            f'Subscription (на самого себя): удалено {self_subscriptions}'
+        )
+        merged = 0
+        duplicates = RecipeIngredient.objects.values(
+            'recipe', 'ingredient'
+        ).annotate(
+            first_id=Min('id'), total=Count('id'), amount_sum=Sum('amount')
+        ).filter(total__gt=1).order_by()
+        for duplicate in duplicates:
+            rows = RecipeIngredient.objects.filter(
+                recipe=duplicate['recipe'],
+                ingredient=duplicate['ingredient']
+            )
+            merged += rows.exclude(id=duplicate['first_id']).delete()[0]
+            rows.update(amount=duplicate['amount_sum'])
+        self.stdout.write(f'RecipeIngredient: объединено {merged}')
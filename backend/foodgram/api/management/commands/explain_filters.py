@@ -0,0 +1,119 @@
+import json
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe, Tag
+from users.models import User
+
+from .generate_data import EMAIL_DOMAIN
+
+PLAN_PREFIXES = {
+    'postgresql': 'EXPLAIN',
+    'sqlite': 'EXPLAIN QUERY PLAN',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время выполнения фильтров рецептов: прежние '
+        'JOIN с DISTINCT и текущие EXISTS из RecipeFilter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default=f'user0@{EMAIL_DOMAIN}',
+                            help='Пользователь для фильтров избранного.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Повторов каждого запроса.')
+        parser.add_argument('--plans', action='store_true',
+                            help='Вывести планы запросов целиком.')
+
+    def scenarios(self, user):
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        recipes = Recipe.objects.all()
+        return {
+            'tags': (
+                {'tags': slugs},
+                recipes.filter(tags__slug__in=slugs).distinct(),
+            ),
+            'is_favorited': (
+                {'is_favorited': '1'},
+                recipes.filter(favorite__user=user),
+            ),
+            'is_in_shopping_cart': (
+                {'is_in_shopping_cart': '1'},
+                recipes.filter(in_carts__user=user),
+            ),
+            'tags_is_favorited': (
+                {'tags': slugs, 'is_favorited': '1'},
+                recipes.filter(
+                    tags__slug__in=slugs, favorite__user=user
+                ).distinct(),
+            ),
+        }
+
+    def filtered(self, user, params):
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = user
+        filterset = RecipeFilter(
+            request.GET, queryset=Recipe.objects.all(), request=request
+        )
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        return filterset.qs
+
+    def measure(self, queryset, repeat):
+        queryset = queryset.order_by('-pub_date', '-id')
+        page = queryset.values_list('pk', flat=True)[:6]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(page.all())
+            queryset.all().count()
+            timings.append((time.perf_counter() - started) * 1000)
+        result = {'ms': round(statistics.median(timings), 2), 'cost': None}
+        if connection.vendor == 'postgresql':
+            plan = self.explain(page, 'EXPLAIN (FORMAT JSON)')[0][0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            result['cost'] = plan[0]['Plan']['Total Cost']
+        result['plan'] = '\n'.join(
+            str(row[-1]) for row in self.explain(
+                page, PLAN_PREFIXES.get(connection.vendor, 'EXPLAIN')
+            )
+        )
+        return result
+
+    def explain(self, queryset, prefix):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return cursor.fetchall()
+
+    def handle(self, *args, **kwargs):
+        user = User.objects.filter(email=kwargs['email']).first()
+        if user is None:
+            raise CommandError(
+                f'Пользователь {kwargs["email"]} не найден; '
+                f'запустите generate_data или передайте --email.'
+            )
+        self.stdout.write(
+            f'{"фильтр":<22}{"JOIN, мс":>10}{"EXISTS, мс":>12}'
+            f'{"JOIN, cost":>12}{"EXISTS, cost":>14}'
+        )
+        for name, (params, joined) in self.scenarios(user).items():
+            before = self.measure(joined, kwargs['repeat'])
+            after = self.measure(
+                self.filtered(user, params), kwargs['repeat']
+            )
+            self.stdout.write(
+                f'{name:<22}{before["ms"]:>10}{after["ms"]:>12}'
+                f'{str(before["cost"]):>12}{str(after["cost"]):>14}'
+            )
+            if kwargs['plans']:
+                self.stdout.write(f'JOIN:\n{before["plan"]}')
+                self.stdout.write(f'EXISTS:\n{after["plan"]}')
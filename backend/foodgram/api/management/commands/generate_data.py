@@ -0,0 +1,207 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+
+from api.catalog import bump_cache_version
+from api.importers import IngredientImporter, read_json
+from api.signals import shopping_lists_paused
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+EMAIL_DOMAIN = 'bench.foodgram.local'
+PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт воспроизводимый набор данных для нагрузочных замеров: '
+        'пользователей, теги, рецепты, избранное, корзины и подписки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок у пользователя.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданные генератором данные.'
+        )
+
+    def handle(self, *args, **kwargs):
+        self.rng = random.Random(kwargs['seed'])
+        self.batch_size = kwargs['batch_size']
+        generated = User.objects.filter(email__endswith='@' + EMAIL_DOMAIN)
+        if generated.exists():
+            if not kwargs['clear']:
+                raise CommandError(
+                    'Данные генератора уже есть; добавьте --clear, '
+                    'чтобы создать их заново.'
+                )
+            with shopping_lists_paused():
+                generated.delete()
+        if not Ingredient.objects.exists():
+            self.step('ingredients', self.create_ingredients)
+        with transaction.atomic():
+            tags = self.step('tags', self.create_tags, kwargs['tags'])
+            users = self.step('users', self.create_users, kwargs['users'])
+            recipes = self.step(
+                'recipes', self.create_recipes, users, tags,
+                kwargs['recipes']
+            )
+            for model, per_user in (
+                (Favorite, kwargs['favorites']),
+                (ShoppingCart, kwargs['carts']),
+            ):
+                self.step(
+                    model._meta.model_name, self.create_relations,
+                    model, 'recipe_id', users, recipes, per_user
+                )
+            self.step(
+                'subscriptions', self.create_relations,
+                Subscription, 'author_id', users, users,
+                kwargs['subscriptions'], True
+            )
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        for name in ('tags', 'ingredients', 'recipes', 'users', 'popularity'):
+            bump_cache_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пароль пользователей *@{EMAIL_DOMAIN}: {PASSWORD}'
+        ))
+
+    def step(self, name, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(
+            f'{name}: {count} за {time.monotonic() - started:.1f} с'
+        )
+        return result
+
+    def create_ingredients(self):
+        importer = IngredientImporter('data')
+        with open('data/ingredients.json', encoding='utf-8') as file:
+            batch = []
+            for row in read_json(file, importer.fields):
+                batch.append(row)
+                if len(batch) == self.batch_size:
+                    importer.import_batch(batch)
+                    batch = []
+            if batch:
+                importer.import_batch(batch)
+        return importer.created
+
+    def create_tags(self, count):
+        tags = []
+        for number in range(count):
+            tag, _ = Tag.objects.get_or_create(
+                slug=f'bench-{number}',
+                defaults={
+                    'name': f'Тег {number}',
+                    'color': f'#{self.rng.randrange(0x1000000):06x}',
+                }
+            )
+            tags.append(tag.pk)
+        return tags
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'user{number}@{EMAIL_DOMAIN}',
+                    username=f'bench{number}',
+                    first_name='Имя',
+                    last_name=f'Фамилия {number}',
+                    password=password
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size
+        )
+        return list(User.objects.filter(
+            email__endswith='@' + EMAIL_DOMAIN
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, users, tags, count):
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=self.rng.choice(users),
+                    name=f'Рецепт {number}',
+                    text=f'Описание рецепта {number}.',
+                    cooking_time=self.rng.randint(
+                        settings.MIN_VALIDATOR, 180
+                    )
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size
+        )
+        recipes = list(Recipe.objects.filter(
+            author__in=users
+        ).order_by('pk').values_list('pk', flat=True))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe,
+                    ingredient_id=ingredient,
+                    amount=self.rng.randint(1, 500)
+                )
+                for recipe in recipes
+                for ingredient in self.rng.sample(
+                    ingredients, self.rng.randint(3, 12)
+                )
+            ),
+            batch_size=self.batch_size
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+                for recipe in recipes
+                for tag in self.rng.sample(
+                    tags, min(len(tags), self.rng.randint(1, 3))
+                )
+            ),
+            batch_size=self.batch_size
+        )
+        return recipes
+
+    def create_relations(self, model, field, users, targets, per_user,
+                         exclude_self=False):
+        created = 0
+        for start in range(0, len(users), self.batch_size):
+            rows = []
+            for user in users[start:start + self.batch_size]:
+                chosen = [
+                    target for target in self.rng.sample(
+                        targets, min(len(targets), per_user + 1)
+                    )
+                    if not exclude_self or target != user
+                ]
+                rows.extend(
+                    model(user_id=user, **{field: target})
+                    for target in chosen[:per_user]
+                )
+            model.objects.bulk_create(rows)
+            created += len(rows)
+        return created
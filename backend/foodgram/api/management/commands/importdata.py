@@ -1,18 +1,96 @@
-import json
+import os
+import time
+from itertools import islice
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
-from recipes.models import Ingredient
+from api.importers import IMPORTERS, READERS
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        with open('data/ingredients.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    help = (
+        'Загружает ингредиенты, теги, пользователей или рецепты из CSV, '
+        'JSON или JSON Lines. Повторная загрузка обновляет уже '
+        'существующие записи.'
+    )
 
-        Ingredient.objects.bulk_create(
-            [Ingredient(
-                name=row['name'],
-                measurement_unit=row['measurement_unit']
-            )for row in data]
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='data/ingredients.json',
+            help='Путь к файлу; по умолчанию data/ingredients.json.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла; по умолчанию берётся из расширения.'
+        )
+        parser.add_argument(
+            '--model',
+            choices=IMPORTERS,
+            help='Что загружать; по умолчанию берётся из имени файла.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.IMPORT_BATCH_SIZE,
+            help='Сколько строк записывать за одну транзакцию.'
         )
+        parser.add_argument(
+            '--start',
+            type=int,
+            default=0,
+            help='Пропустить первые N строк, чтобы продолжить '
+                 'прерванную загрузку.'
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        name, extension = os.path.splitext(os.path.basename(path))
+        format = kwargs['format'] or extension.lstrip('.').lower()
+        model = kwargs['model'] or name
+        if format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {format}.')
+        if model not in IMPORTERS:
+            raise CommandError(f'Не понятно, что загружать из {path}.')
+        importer = IMPORTERS[model](os.path.dirname(path))
+        batch_size = kwargs['batch_size']
+        processed = kwargs['start']
+        started = time.monotonic()
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = islice(
+                READERS[format](file, importer.fields), processed, None
+            )
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                try:
+                    with transaction.atomic():
+                        importer.import_batch(batch)
+                except (KeyError, TypeError, ValueError) as error:
+                    raise CommandError(
+                        f'Ошибка в строках {processed + 1}–'
+                        f'{processed + len(batch)}: {error!r}. Загрузка '
+                        f'продолжится с --start {processed}.'
+                    )
+                processed += len(batch)
+                self.stdout.write(
+                    f'Загружено строк: {processed} '
+                    f'({self.rate(processed - kwargs["start"], started)}).'
+                )
+        importer.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'{model}: создано {importer.created}, '
+            f'обновлено {importer.updated}, строк '
+            f'{processed - kwargs["start"]} за '
+            f'{time.monotonic() - started:.1f} с '
+            f'({self.rate(processed - kwargs["start"], started)}).'
+        ))
+
+    def rate(self, rows, started):
+        elapsed = time.monotonic() - started
+        return f'{rows / elapsed if elapsed else 0:.0f} строк/с'
@@ -0,0 +1,44 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает списки покупок по содержимому корзин.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить сохранённые списки с живым расчётом.'
+        )
+
+    def handle(self, *args, **kwargs):
+        if not kwargs['check']:
+            ShoppingListItem.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок пересчитаны: '
+                f'{ShoppingListItem.objects.count()} позиций.'
+            ))
+            return
+        stored = {
+            (item['user_id'], item['ingredient_id']): item['total_amount']
+            for item in ShoppingListItem.objects.values(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).order_by()
+        }
+        live = {
+            (item['user_id'], item['ingredient_id']): item['total_amount']
+            for item in ShoppingListItem.objects.live()
+        }
+        mismatches = [
+            key for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)
+        ]
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок совпадают с корзинами.'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.conditional import popularity_changed
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, корзин, рецептов и подписчиков.'
+
+    @transaction.atomic
+    def handle(self, *args, **kwargs):
+        for model, counter, related_model, field in COUNTERS:
+            actual = Coalesce(Subquery(
+                related_model.objects.filter(
+                    **{field: OuterRef('pk')}
+                ).order_by().values(field).annotate(
+                    total=Count('pk')
+                ).values('total')
+            ), 0)
+            drifted = model.objects.annotate(actual=actual).exclude(
+                **{counter: F('actual')}
+            )
+            fixed = model.objects.filter(
+                pk__in=drifted.values('pk')
+            ).update(**{counter: actual})
+            if fixed and counter == 'favorites_count':
+                popularity_changed()
+            self.stdout.write(
+                f'{model.__name__}.{counter}: исправлено {fixed}'
+            )
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from api.images import render_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Готовит уменьшенные копии картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для рецептов, у которых они уже есть.'
+        )
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.exclude(image='')
+        if not kwargs['all']:
+            recipes = recipes.filter(image_renditions={})
+        rendered = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            rendered += render_recipe_image(recipe_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинки подготовлены для рецептов: {rendered}.'
+        ))
@@ -0,0 +1,169 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+FAMILIES = {
+    'foodgram_requests_total': (
+        'counter', 'Обработанные запросы по маршруту, методу и статусу.'
+    ),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время обработки запроса по маршруту.'
+    ),
+    'foodgram_request_queries': (
+        'histogram', 'Число SQL-запросов на один HTTP-запрос по маршруту.'
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'SQL-запросы по маршруту.'
+    ),
+    'foodgram_db_connections_total': (
+        'counter', 'Открытые соединения с базой данных.'
+    ),
+    'foodgram_db_connections_dropped_total': (
+        'counter', 'Закрытые проверкой неработоспособные соединения.'
+    ),
+    'foodgram_db_pool_requests_total': (
+        'counter', 'Выдача соединений из пула: из пула (hit) и новые (miss).'
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кешам: попадания (hit) и промахи (miss).'
+    ),
+}
+HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+_values = defaultdict(float)
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flushed = 0.0
+
+
+def inc(name, labels=None, value=1):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with _lock:
+        _values[key] += value
+    maybe_flush()
+
+
+def observe(name, labels, value, buckets):
+    labels = tuple(sorted(labels.items()))
+    with _lock:
+        for bound in buckets:
+            _values[
+                (f'{name}_bucket', labels + (('le', str(bound)),))
+            ] += value <= bound
+        _values[(f'{name}_bucket', labels + (('le', '+Inf'),))] += 1
+        _values[(f'{name}_sum', labels)] += value
+        _values[(f'{name}_count', labels)] += 1
+    maybe_flush()
+
+
+def cache_result(cache, hit):
+    inc('foodgram_cache_requests_total', {
+        'cache': cache, 'result': 'hit' if hit else 'miss'
+    })
+
+
+def snapshot():
+    with _lock:
+        return [
+            [name, list(labels), value]
+            for (name, labels), value in _values.items()
+        ]
+
+
+def write_snapshot():
+    global _flushed
+    _flushed = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(snapshot(), file, ensure_ascii=False)
+    os.replace(temporary, path)
+
+
+def flush():
+    with _flush_lock:
+        write_snapshot()
+
+
+def maybe_flush():
+    if settings.METRICS_DIR and _flush_lock.acquire(blocking=False):
+        try:
+            if (
+                time.monotonic() - _flushed
+                > settings.METRICS_FLUSH_INTERVAL
+            ):
+                write_snapshot()
+        finally:
+            _flush_lock.release()
+
+
+if settings.METRICS_DIR:
+    atexit.register(flush)
+
+
+def collect():
+    if not settings.METRICS_DIR:
+        return snapshot()
+    flush()
+    values = defaultdict(float)
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in rows:
+            values[name, tuple(map(tuple, labels))] += value
+    return [[name, labels, value] for (name, labels), value in values.items()]
+
+
+def family(name):
+    if name in FAMILIES:
+        return name
+    for suffix in HISTOGRAM_SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"'
+        ).replace('\n', '\\n'))
+        for key, value in labels
+    ) + '}'
+
+
+def render():
+    samples = defaultdict(list)
+    for name, labels, value in collect():
+        samples[family(name)].append((name, labels, value))
+    lines = []
+    for name in sorted(samples):
+        kind, description = FAMILIES.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample, labels, value in samples[name]:
+            value = int(value) if float(value).is_integer() else value
+            lines.append(f'{sample}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(
+        render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,193 @@
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from rest_framework.serializers import BaseSerializer
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_samples = defaultdict(
+    lambda: deque(maxlen=settings.REQUEST_PROFILING_WINDOW)
+)
+_lock = threading.Lock()
+_serialization = threading.local()
+
+
+def endpoint_name(request):
+    match = request.resolver_match
+    view_name = match.view_name if match else 'unmatched'
+    return f'{request.method} {view_name}'
+
+
+def profiling_summary():
+    with _lock:
+        samples = {name: list(rows) for name, rows in _samples.items()}
+    summary = {}
+    for name, rows in samples.items():
+        totals = sorted(row['total_ms'] for row in rows)
+        queries = [row['queries'] for row in rows]
+        summary[name] = {
+            'requests': len(rows),
+            'p50_ms': round(statistics.median(totals), 2),
+            'p95_ms': round(totals[int(len(totals) * 0.95)], 2),
+            'db_ms': round(
+                statistics.mean(row['db_ms'] for row in rows), 2
+            ),
+            'serialize_ms': round(
+                statistics.mean(row['serialize_ms'] for row in rows), 2
+            ),
+            'queries_mean': round(statistics.mean(queries), 1),
+            'queries_max': max(queries),
+            'duplicates': sum(bool(row['duplicates']) for row in rows),
+        }
+    return dict(sorted(
+        summary.items(), key=lambda item: item[1]['p95_ms'], reverse=True
+    ))
+
+
+def profile_serialization():
+    data = BaseSerializer.data.fget
+    if getattr(data, 'profiled', False):
+        return
+
+    def timed_data(serializer):
+        depth = getattr(_serialization, 'depth', 0)
+        _serialization.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            _serialization.depth = depth
+            if not depth:
+                _serialization.seconds = getattr(
+                    _serialization, 'seconds', 0
+                ) + time.perf_counter() - started
+
+    timed_data.profiled = True
+    BaseSerializer.data = property(timed_data)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        match = request.resolver_match
+        labels = {
+            'route': match.view_name if match else 'unmatched',
+            'method': request.method,
+        }
+        metrics.observe(
+            'foodgram_request_duration_seconds', labels,
+            time.perf_counter() - started, metrics.LATENCY_BUCKETS
+        )
+        metrics.observe(
+            'foodgram_request_queries', labels, counter.count,
+            metrics.QUERY_BUCKETS
+        )
+        metrics.inc('foodgram_db_queries_total', labels, counter.count)
+        metrics.inc(
+            'foodgram_requests_total',
+            {**labels, 'status': str(response.status_code)}
+        )
+        return response
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        profile_serialization()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.render_started = None
+        _serialization.seconds = 0
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+        view_finished = request.render_started or finished
+        serialized = _serialization.seconds
+        sample = {
+            'queries': len(recorder.queries),
+            'db_ms': sum(duration for _, duration in recorder.queries) * 1000,
+            'view_ms': (view_finished - started - serialized) * 1000,
+            'serialize_ms': serialized * 1000,
+            'render_ms': (finished - view_finished) * 1000,
+            'total_ms': (finished - started) * 1000,
+            'duplicates': {
+                sql: count
+                for sql, count in Counter(
+                    sql for sql, _ in recorder.queries
+                ).items()
+                if count >= settings.REQUEST_PROFILING_DUPLICATES
+            },
+        }
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={sample["db_ms"]:.1f};desc="{sample["queries"]} queries"',
+            f'view;dur={sample["view_ms"]:.1f}',
+            f'serialize;dur={sample["serialize_ms"]:.1f}',
+            f'render;dur={sample["render_ms"]:.1f}',
+            f'total;dur={sample["total_ms"]:.1f}',
+        ))
+        name = endpoint_name(request)
+        with _lock:
+            _samples[name].append(sample)
+        logger.log(
+            logging.WARNING if sample['duplicates'] else logging.INFO,
+            json.dumps({
+                'endpoint': name,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'size': (
+                    None if response.streaming else len(response.content)
+                ),
+                **{
+                    key: round(value, 2) if isinstance(value, float)
+                    else value
+                    for key, value in sample.items()
+                },
+            }, ensure_ascii=False)
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        request.render_started = time.perf_counter()
+        return response
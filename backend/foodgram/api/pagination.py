@@ -1,6 +1,100 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_ordering = getattr(view, 'cursor_ordering', None)
+        if (
+            self.cursor_ordering is None
+            or self.cursor_query_param not in request.query_params
+        ):
+            self.cursor_ordering = None
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.cursor_ordering = self.get_cursor_ordering(queryset)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(self.decode_cursor(queryset, cursor))
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def get_cursor_ordering(self, queryset):
+        ordering, names = [], set()
+        for field in queryset.query.order_by or self.cursor_ordering:
+            name = field.lstrip('-')
+            if name not in names:
+                names.add(name)
+                ordering.append(field)
+        if 'id' not in names:
+            ordering.append('-id')
+        return ordering
+
+    def get_paginated_response(self, data):
+        if self.cursor_ordering is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ]))
+
+    def get_next_cursor_link(self):
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor
+        )
+
+    def encode_cursor(self, instance):
+        position = [
+            str(getattr(instance, field.lstrip('-')))
+            for field in self.cursor_ordering
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, queryset, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(position) != len(self.cursor_ordering):
+                raise ValueError
+            values = [
+                queryset.model._meta.get_field(
+                    field.lstrip('-')
+                ).to_python(value)
+                for field, value in zip(self.cursor_ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        for index, field in enumerate(self.cursor_ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(self.cursor_ordering[:index], values):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
@@ -1,33 +1,71 @@
 import base64
+import binascii
+from collections import Counter, defaultdict
+from tempfile import SpooledTemporaryFile
 
-from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import default_storage
 from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
-from rest_framework.serializers import (ImageField, IntegerField,
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import (Field, ImageField, IntegerField,
+                                        ListField, ListSerializer,
                                         ModelSerializer,
                                         PrimaryKeyRelatedField, ReadOnlyField,
-                                        SerializerMethodField)
+                                        Serializer, SerializerMethodField)
 
 from recipes.models import (Ingredient, Recipe, RecipeIngredient,
-                            Tag)
+                            ShoppingListItem, Tag)
 from users.models import User
 
+from .images import schedule_renditions
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None or not recipes_limit.isdigit():
+        return None
+    return int(recipes_limit)
+
+
+class RecipeIngredientListSerializer(ListSerializer):
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        ids = [ingredient.pop('ingredient_id') for ingredient in ingredients]
+        found = Ingredient.objects.in_bulk(ids)
+        errors = []
+        missing = sorted({pk for pk in ids if pk not in found})
+        if missing:
+            errors.append(
+                'Ингредиенты не найдены: '
+                + ', '.join(str(pk) for pk in missing) + '.'
+            )
+        duplicates = sorted(
+            pk for pk, count in Counter(ids).items() if count > 1
+        )
+        if duplicates:
+            errors.append(
+                'Ингредиенты не должны повторяться: '
+                + ', '.join(str(pk) for pk in duplicates) + '.'
+            )
+        if errors:
+            raise ValidationError(errors)
+        for ingredient, pk in zip(ingredients, ids):
+            ingredient['ingredient'] = found[pk]
+        return ingredients
+
 
 class RecipeIngredientSerializer(ModelSerializer):
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = IntegerField(source='ingredient_id', min_value=1)
     name = ReadOnlyField(source='ingredient.name')
     measurement_unit = ReadOnlyField(source='ingredient.measurement_unit')
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount',)
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        data['id'] = instance.ingredient.id
-        return data
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class IngredientSerializer(ModelSerializer):
@@ -43,13 +81,54 @@ class TagSerializer(ModelSerializer):
 
 
 class Base64ImageField(ImageField):
+    default_error_messages = {
+        **ImageField.default_error_messages,
+        'max_size': 'Размер картинки не должен превышать {max_size} Мб.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(imgstr, 'temp.' + ext)
         return super().to_internal_value(data)
 
+    def decode(self, imgstr, name):
+        if len(imgstr) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail(
+                'max_size',
+                max_size=settings.RECIPE_IMAGE_MAX_SIZE // (1024 * 1024)
+            )
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        chunk = settings.RECIPE_IMAGE_DECODE_CHUNK
+        try:
+            for start in range(0, len(imgstr), chunk):
+                file.write(base64.b64decode(imgstr[start:start + chunk]))
+        except binascii.Error:
+            self.fail('invalid_image')
+        file.seek(0)
+        return File(file, name=name)
+
+
+class ImageRenditionsField(Field):
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        request = self.context.get('request')
+        urls = {}
+        for format, names in renditions.items():
+            urls[format] = {}
+            for width, name in names.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[format][width] = url
+        return urls
+
 
 class MeUserSerializer(UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
@@ -61,6 +140,8 @@ class MeUserSerializer(UserSerializer):
             'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -78,21 +159,27 @@ class RecipeGetSerializer(ModelSerializer):
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+            'text', 'cooking_time',
         )
         model = Recipe
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return user.fan.filter(recipe=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -114,7 +201,7 @@ class RecipeNotGetSerializer(ModelSerializer):
     def create_ingredients(self, ingredients, recipe):
         RecipeIngredient.objects.bulk_create(
             [RecipeIngredient(
-                ingredient=ingredient['id'],
+                ingredient=ingredient['ingredient'],
                 recipe=recipe,
                 amount=ingredient['amount']
             )for ingredient in ingredients]
@@ -127,20 +214,75 @@ class RecipeNotGetSerializer(ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        schedule_renditions(recipe)
         return recipe
 
+    def update_ingredients(self, instance, ingredients):
+        current = {
+            item.ingredient_id: item
+            for item in instance.recipeingredient.all()
+        }
+        new = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        amounts = defaultdict(int)
+        created, changed = [], []
+        for ingredient_id, amount in new.items():
+            item = current.get(ingredient_id)
+            if item is None:
+                created.append(RecipeIngredient(
+                    ingredient_id=ingredient_id,
+                    recipe=instance,
+                    amount=amount
+                ))
+                amounts[ingredient_id] += amount
+            elif item.amount != amount:
+                amounts[ingredient_id] += amount - item.amount
+                item.amount = amount
+                changed.append(item)
+        deleted = []
+        for ingredient_id, item in current.items():
+            if ingredient_id not in new:
+                deleted.append(item.pk)
+        RecipeIngredient.objects.bulk_create(created)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if deleted:
+            RecipeIngredient.objects.filter(pk__in=deleted).delete()
+        if amounts:
+            ShoppingListItem.objects.change(
+                instance.in_carts.values_list('user_id', flat=True),
+                amounts
+            )
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.get('tags', instance.tags)
-        instance.tags.set(tags)
+        tags = validated_data.pop('tags', None)
+        if tags is not None and (
+            {tag.pk for tag in tags} != {tag.pk for tag in instance.tags.all()}
+        ):
+            instance.tags.set(tags)
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is not None:
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
-        return super().update(instance, validated_data)
+            self.update_ingredients(instance, ingredients)
+        image = instance.image.name
+        instance = super().update(instance, validated_data)
+        if instance.image.name != image:
+            instance.image_renditions = {}
+            Recipe.objects.filter(pk=instance.pk).update(image_renditions={})
+            schedule_renditions(instance)
+        return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipeingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            'tags'
+        )
         return RecipeGetSerializer(
             instance,
             context={'request': request}
@@ -148,9 +290,11 @@ class RecipeNotGetSerializer(ModelSerializer):
 
 
 class RecipeShortSerializer(ModelSerializer):
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         fields = (
-            'id', 'name', 'image', 'cooking_time',
+            'id', 'name', 'image', 'image_renditions', 'cooking_time',
         )
         read_only_fields = ('name', 'image', 'cooking_time',)
         model = Recipe
@@ -158,55 +302,30 @@ class RecipeShortSerializer(ModelSerializer):
 
 class SubscriptionSerializer(MeUserSerializer):
     recipes = SerializerMethodField()
-    recipes_count = IntegerField(source='recipes.count', read_only=True)
 
     class Meta(MeUserSerializer.Meta):
         fields = MeUserSerializer.Meta.fields + (
             'recipes', 'recipes_count',
         )
-        read_only_fields = ('email', 'username', 'first_name', 'last_name',)
-
-    def validate(self, data):
-        author_id = self.context.get(
-            'request'
-        ).parser_context.get('kwargs').get('id')
-        author = get_object_or_404(User, id=author_id)
-        user = self.context.get('request').user
-        if user == author or user.follower.filter(author=author).exists():
-            raise ValidationError('Ошибка подписки!')
-        return data
+        read_only_fields = (
+            'email', 'username', 'first_name', 'last_name', 'recipes_count',
+        )
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj)
+        if hasattr(obj, 'short_recipes'):
+            recipes = obj.short_recipes
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = RecipeShortSerializer(recipes, many=True)
         return serializer.data
 
 
-class FavoriteSerializer(RecipeShortSerializer):
-    class Meta(RecipeShortSerializer.Meta):
-        fields = RecipeShortSerializer.Meta.fields
-
-    def validate(self, data):
-        recipe_pk = self.context.get(
-            'request'
-        ).parser_context.get('kwargs').get('pk')
-        recipe = get_object_or_404(Recipe, pk=recipe_pk)
-        user = self.context.get('request').user
-        if user.fan.filter(recipe=recipe).exists():
-            raise ValidationError('Рецепт уже есть в избранном!')
-        return data
-
-
-class ShoppingCartSerializer(RecipeShortSerializer):
-    class Meta(RecipeShortSerializer.Meta):
-        fields = RecipeShortSerializer.Meta.fields
-
-    def validate(self, data):
-        recipe_pk = self.context.get(
-            'request'
-        ).parser_context.get('kwargs').get('pk')
-        recipe = get_object_or_404(Recipe, pk=recipe_pk)
-        user = self.context.get('request').user
-        if user.carts.filter(recipe=recipe).exists():
-            raise ValidationError('Рецепт уже есть в списке покупок!')
-        return data
+class BulkRecipesSerializer(Serializer):
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
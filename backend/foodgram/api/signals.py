@@ -0,0 +1,145 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem, Tag)
+from users.models import User
+
+from . import metrics
+from .authentication import forget_token
+from .catalog import bump_cache_version
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    transaction.on_commit(lambda: bump_cache_version('tags'))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    transaction.on_commit(lambda: bump_cache_version('ingredients'))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_changed(**kwargs):
+    transaction.on_commit(lambda: bump_cache_version('recipes'))
+
+
+@receiver((post_save, post_delete), sender=User)
+def users_changed(update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(lambda: bump_cache_version('users'))
+    transaction.on_commit(lambda: bump_cache_version('tokens'))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_token(instance.key)
+    transaction.on_commit(lambda: bump_cache_version('tokens'))
+
+
+_shopping_lists = threading.local()
+
+
+@contextmanager
+def shopping_lists_paused():
+    _shopping_lists.paused = True
+    try:
+        yield
+    finally:
+        _shopping_lists.paused = False
+
+
+def shopping_lists_synced(raw=False):
+    return not raw and not getattr(_shopping_lists, 'paused', False)
+
+
+def cart_contribution(user_id, recipe_id, sign):
+    ShoppingListItem.objects.change(
+        (user_id,),
+        ShoppingListItem.objects.recipe_amounts(recipe_id, sign=sign)
+    )
+
+
+def ingredient_contribution(recipe_id, ingredient_id, amount, sign):
+    ShoppingListItem.objects.change(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True),
+        {ingredient_id: sign * amount}
+    )
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def cart_saving(instance, raw=False, **kwargs):
+    if shopping_lists_synced(raw) and not instance._state.adding:
+        instance.previous_state = ShoppingCart.objects.filter(
+            pk=instance.pk
+        ).values_list('user_id', 'recipe_id').first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_saved(instance, created, raw=False, **kwargs):
+    if not shopping_lists_synced(raw):
+        return
+    state = (instance.user_id, instance.recipe_id)
+    previous = None if created else getattr(instance, 'previous_state', None)
+    if previous == state:
+        return
+    if previous is not None:
+        cart_contribution(*previous, sign=-1)
+    if created or previous is not None:
+        cart_contribution(*state, sign=1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_deleted(instance, **kwargs):
+    if shopping_lists_synced():
+        cart_contribution(instance.user_id, instance.recipe_id, sign=-1)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(instance, raw=False, **kwargs):
+    if shopping_lists_synced(raw) and not instance._state.adding:
+        instance.previous_state = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, created, raw=False, **kwargs):
+    if not shopping_lists_synced(raw):
+        return
+    state = (instance.recipe_id, instance.ingredient_id, instance.amount)
+    previous = None if created else getattr(instance, 'previous_state', None)
+    if previous == state:
+        return
+    if previous is not None:
+        ingredient_contribution(*previous, sign=-1)
+    if created or previous is not None:
+        ingredient_contribution(*state, sign=1)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, **kwargs):
+    if shopping_lists_synced():
+        ingredient_contribution(
+            instance.recipe_id, instance.ingredient_id, instance.amount,
+            sign=-1
+        )
+
+
+@receiver(connection_created)
+def connection_opened(connection, **kwargs):
+    if getattr(connection, 'reused_connection', False):
+        return
+    metrics.inc(
+        'foodgram_db_connections_total', {'vendor': connection.vendor}
+    )
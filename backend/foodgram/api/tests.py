@@ -0,0 +1,434 @@
+import json
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.filters import get_tag_ids
+from api.importers import IngredientImporter, RecipeImporter
+from api.serializers import MeUserSerializer
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingListItem, ShoppingListItemManager, Tag)
+from users.models import Subscription, User
+
+PAGE_SIZES = (1, 6, 100)
+
+
+@override_settings(SHARED_CACHE=False)
+class RecipeQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        User.objects.bulk_create(
+            User(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name='Имя',
+                last_name='Фамилия'
+            )
+            for number in range(5)
+        )
+        authors = list(User.objects.filter(
+            username__startswith='author'
+        ).order_by('pk'))
+        Subscription.objects.create(user=cls.user, author=authors[0])
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', slug=f'tag-{number}',
+                color=f'#00000{number}')
+            for number in range(3)
+        )
+        tags = list(Tag.objects.order_by('pk'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        )
+        ingredients = list(Ingredient.objects.order_by('pk'))
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10
+            )
+            for number in range(120)
+        )
+        recipes = list(Recipe.objects.all())
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for index, recipe in enumerate(recipes)
+            for ingredient in ingredients[index % 5:index % 5 + 4]
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for index, recipe in enumerate(recipes)
+            for tag in tags[:index % 3 + 1]
+        )
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        cache.clear()
+        get_tag_ids()
+
+    def assert_list_queries(self, count):
+        for page_size in PAGE_SIZES:
+            with self.subTest(limit=page_size):
+                with self.assertNumQueries(count):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': page_size}
+                    )
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(5)
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(5)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_list_authenticated_etag(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(6)
+
+    def test_retrieve_anonymous(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.data['id'], self.recipe.pk)
+
+    def test_retrieve_authenticated(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.data['id'], self.recipe.pk)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_retrieve_authenticated_etag(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(6):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.data['id'], self.recipe.pk)
+
+    def test_etags_need_shared_cache(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/')
+        self.assertNotIn('ETag', response)
+        with override_settings(SHARED_CACHE=True):
+            response = self.client.get('/api/recipes/')
+            response = self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_cursor_pages_skip_count(self):
+        path = '/api/recipes/?cursor=&limit=6'
+        for _ in range(3):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(path)
+            self.assertEqual(len(response.data['results']), 6)
+            self.assertEqual(len(context.captured_queries), 4)
+            for query in context.captured_queries:
+                self.assertNotIn('COUNT(', query['sql'])
+                self.assertNotIn('MAX(', query['sql'])
+            path = response.data['next']
+
+    def test_cursor_follows_ordering(self):
+        Recipe.objects.update(favorites_count=F('id') % 7)
+        expected = list(Recipe.objects.order_by(
+            '-favorites_count', '-pub_date', '-id'
+        ).values_list('pk', flat=True)[:18])
+        path = '/api/recipes/?cursor=&limit=6&ordering=-popularity'
+        ids = []
+        for _ in range(3):
+            response = self.client.get(path)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            path = response.data['next']
+        self.assertEqual(ids, expected)
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10
+        )
+        self.client.force_authenticate(self.author)
+
+    def test_drifted_counters_are_clamped(self):
+        for action in ('favorite', 'shopping_cart'):
+            with self.subTest(action=action):
+                path = f'/api/recipes/{self.recipe.pk}/{action}/'
+                self.client.post(path)
+                Recipe.objects.update(favorites_count=0, carts_count=0)
+                response = self.client.delete(path)
+                self.assertEqual(response.status_code, 204)
+        response = self.client.delete(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+
+class ShoppingListTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.first, cls.second = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for name in ('author', 'first', 'second')
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.salt, cls.milk, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'молоко', 'мука')
+        )
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Блины', text='Описание',
+            cooking_time=10
+        )
+        self.recipe.tags.add(self.tag)
+        RecipeIngredient.objects.bulk_create((
+            RecipeIngredient(
+                recipe=self.recipe, ingredient=self.salt, amount=3
+            ),
+            RecipeIngredient(
+                recipe=self.recipe, ingredient=self.milk, amount=7
+            ),
+        ))
+
+    def assert_matches_live(self):
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )),
+            {
+                (item['user_id'], item['ingredient_id'],
+                 item['total_amount'])
+                for item in ShoppingListItem.objects.live()
+            }
+        )
+
+    def add_to_cart(self, user, recipe):
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            f'/api/recipes/{recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_add_update_delete(self):
+        self.add_to_cart(self.first, self.recipe)
+        self.add_to_cart(self.second, self.recipe)
+        self.assert_matches_live()
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {'ingredients': [
+                {'id': self.milk.pk, 'amount': 2},
+                {'id': self.flour.pk, 'amount': 5},
+            ]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_live()
+        self.client.force_authenticate(self.first)
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_matches_live()
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_matches_live()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_import(self):
+        self.add_to_cart(self.first, self.recipe)
+        self.add_to_cart(self.second, self.recipe)
+        importer = RecipeImporter('data')
+        importer.import_batch([{
+            'author': self.author.email,
+            'name': self.recipe.name,
+            'text': 'Новое описание',
+            'cooking_time': '15',
+            'tags': [self.tag.slug],
+            'ingredients': [
+                {'name': 'молоко', 'measurement_unit': 'г', 'amount': 7},
+                {'name': 'мука', 'measurement_unit': 'г', 'amount': 4},
+            ],
+        }])
+        self.assertEqual(importer.updated, 1)
+        self.assert_matches_live()
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.first, ingredient=self.milk
+            ).total_amount,
+            7
+        )
+
+    def test_model_changes(self):
+        cart = ShoppingCart.objects.create(user=self.first, recipe=self.recipe)
+        self.assert_matches_live()
+        item = RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=self.salt
+        )
+        item.amount = 9
+        item.save()
+        self.assert_matches_live()
+        item.ingredient = self.flour
+        item.save()
+        self.assert_matches_live()
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=1
+        )
+        self.assert_matches_live()
+        cart.user = self.second
+        cart.save()
+        self.assert_matches_live()
+        item.delete()
+        self.assert_matches_live()
+        cart.delete()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_bulk(self):
+        self.client.force_authenticate(self.first)
+        path = '/api/recipes/shopping_cart/bulk/'
+        response = self.client.post(
+            path, {'ids': [self.recipe.pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_live()
+        response = self.client.delete(
+            path, {'ids': [self.recipe.pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_account_deleted(self):
+        self.add_to_cart(self.first, self.recipe)
+        self.add_to_cart(self.second, self.recipe)
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(
+            '/api/users/me/', {'current_password': 'password'}, format='json'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_concurrent_item_insert(self):
+        bulk_create = ShoppingListItemManager.bulk_create
+        raced = []
+
+        def racing_bulk_create(manager, items, *args, **kwargs):
+            if items and not raced:
+                raced.append(True)
+                bulk_create(manager, [
+                    ShoppingListItem(
+                        user_id=item.user_id,
+                        ingredient_id=item.ingredient_id,
+                        total_amount=1
+                    )
+                    for item in items
+                ])
+            return bulk_create(manager, items, *args, **kwargs)
+
+        with mock.patch.object(
+            ShoppingListItemManager, 'bulk_create', racing_bulk_create
+        ):
+            self.add_to_cart(self.first, self.recipe)
+        self.assertTrue(raced)
+        self.assert_matches_live()
+
+
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SHARED_CACHE=False, CATALOG_LOCAL_TIMEOUT=0)
+    def test_local_catalog_expires(self):
+        self.client.get('/api/tags/')
+        Tag.objects.bulk_create(
+            (Tag(name='Ужин', slug='dinner', color='#000000'),)
+        )
+        response = self.client.get('/api/tags/')
+        self.assertEqual(
+            [tag['slug'] for tag in json.loads(response.content)],
+            ['dinner']
+        )
+
+
+class IngredientSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Рисовая мука', 'Мука', 'Мускатный орех', 'Соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def test_prefix_matches_first(self):
+        response = self.client.get('/api/ingredients/', {'name': 'МУ'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['Мука', 'Мускатный орех', 'Рисовая мука']
+        )
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_limit_prefers_prefix(self):
+        response = self.client.get('/api/ingredients/', {'name': 'му'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['Мука', 'Мускатный орех']
+        )
+
+    def test_import_backfills_cyrillic(self):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name='Молоко', measurement_unit='мл'),)
+        )
+        importer = IngredientImporter('data')
+        importer.finish()
+        self.assertEqual(importer.updated, 1)
+        self.assertTrue(
+            Ingredient.objects.filter(search_name='молоко').exists()
+        )
+
+
+class RequestProfilingTests(APITestCase):
+    @override_settings(REQUEST_PROFILING=True)
+    def test_server_timing_splits_serialization(self):
+        User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        to_representation = MeUserSerializer.to_representation
+
+        def slow_representation(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+
+        with mock.patch.object(
+            MeUserSerializer, 'to_representation', slow_representation
+        ):
+            response = self.client.get('/api/users/')
+        timings = {
+            name: float(duration[len('dur='):])
+            for name, duration in (
+                entry.split(';')[:2]
+                for entry in response['Server-Timing'].split(', ')
+            )
+        }
+        self.assertEqual(
+            list(timings), ['db', 'view', 'serialize', 'render', 'total']
+        )
+        self.assertGreaterEqual(timings['serialize'], 50)
+        self.assertLess(timings['view'], 50)
@@ -1,7 +1,8 @@
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, MeUserViewSet, RecipeViewSet, TagViewSet
+from .views import (IngredientViewSet, MeUserViewSet, ProfilingView,
+                    RecipeViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -13,6 +14,7 @@ router.register('ingredients', IngredientViewSet)
 router.register('users', MeUserViewSet)
 
 urlpatterns = [
+    path('profiling/', ProfilingView.as_view(), name='profiling'),
     path('', include(router.urls)),
     re_path(r'^auth/', include('djoser.urls.authtoken')),
 ]
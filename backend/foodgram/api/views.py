@@ -1,35 +1,67 @@
-from django.db.models.aggregates import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.db.models.functions import Greatest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
 from api.filters import NameFilter, RecipeFilter
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 from users.models import Subscription, User
 
+from . import metrics
+from .catalog import CachedCatalogMixin
+from .conditional import (anonymous_cache_key, popularity_changed,
+                          recipe_versions, recipes_etag)
+from .middleware import profiling_summary
 from .pagination import CustomPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, IngredientSerializer,
+from .renderers import (CsvShoppingCartRenderer, JsonShoppingCartRenderer,
+                        TxtShoppingCartRenderer)
+from .serializers import (BulkRecipesSerializer, IngredientSerializer,
                           MeUserSerializer, RecipeGetSerializer,
-                          RecipeNotGetSerializer, ShoppingCartSerializer,
-                          SubscriptionSerializer, TagSerializer)
+                          RecipeNotGetSerializer, RecipeShortSerializer,
+                          SubscriptionSerializer, TagSerializer,
+                          get_recipes_limit)
+
+NON_FIELD_ERRORS_KEY = api_settings.NON_FIELD_ERRORS_KEY
 
 
 class MeUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = MeUserSerializer
     pagination_class = CustomPagination
+    cursor_ordering = ('-id',)
 
     @action(detail=False, permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:recipes_limit]
+            ))
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='short_recipes')
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
             pages,
@@ -47,21 +79,36 @@ class MeUserViewSet(UserViewSet):
         user = request.user
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
+            try:
+                with transaction.atomic():
+                    Subscription.objects.create(user=user, author=author)
+                    User.objects.filter(pk=author.pk).update(
+                        followers_count=F('followers_count') + 1
+                    )
+            except IntegrityError:
+                return Response(
+                    {NON_FIELD_ERRORS_KEY: ['Ошибка подписки!']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            author.is_subscribed = True
             serializer = SubscriptionSerializer(
                 author,
-                data=request.data,
                 context={'request': request}
             )
-            serializer.is_valid(raise_exception=True)
-            Subscription.objects.create(user=user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if user.follower.filter(author=author).exists():
-                subscription = Subscription.objects.filter(
+            with transaction.atomic():
+                deleted, _ = Subscription.objects.filter(
                     user=user,
                     author=author
-                )
-                subscription.delete()
+                ).delete()
+                if deleted:
+                    User.objects.filter(pk=author.pk).update(
+                        followers_count=Greatest(
+                            F('followers_count') - deleted, 0
+                        )
+                    )
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'detail': 'Вы не подписаны на данного пользователя!'},
@@ -73,15 +120,121 @@ class RecipeViewSet(ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = CustomPagination
+    cursor_ordering = ('-pub_date', '-id')
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        user = self.request.user
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        queryset = super().get_queryset().prefetch_related(
+            Prefetch('author', queryset=authors),
+            Prefetch(
+                'recipeingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            'tags',
+        )
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+        return queryset
+
+    def cached_response(self, request, get_etag, get_response):
+        cache_key = None
+        if request.user.is_anonymous and isinstance(
+            request.accepted_renderer, JSONRenderer
+        ):
+            cache_key = anonymous_cache_key(request)
+            cached = cache.get(cache_key)
+            metrics.cache_result('anonymous', cached is not None)
+            if cached is not None:
+                etag, content = cached
+                response = None
+                if etag is not None:
+                    response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = HttpResponse(
+                        content, content_type='application/json'
+                    )
+                if etag is not None:
+                    response['ETag'] = etag
+                return response
+        etag = get_etag() if settings.SHARED_CACHE else None
+        response = None
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag)
+            metrics.cache_result('etag', response is not None)
+        if response is None:
+            response = get_response()
+            if cache_key is not None and response.status_code == 200:
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(
+                        cache_key,
+                        (etag, rendered.content),
+                        settings.ANONYMOUS_CACHE_TIMEOUT
+                    )
+                )
+        if etag is not None:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: recipes_etag(
+                request, recipe_versions(request, ('recipes',))
+            ),
+            lambda: super(RecipeViewSet, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_etag():
+            try:
+                updated_at = Recipe.objects.filter(
+                    pk=kwargs['pk']
+                ).values_list('updated_at', flat=True).first()
+            except ValueError:
+                return None
+            if updated_at is None:
+                return None
+            return recipes_etag(request, updated_at)
+
+        return self.cached_response(
+            request,
+            get_etag,
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeGetSerializer
         return RecipeNotGetSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=Greatest(F('recipes_count') - 1, 0)
+        )
 
     @action(
         methods=['post', 'delete', ],
@@ -92,18 +245,34 @@ class RecipeViewSet(ModelViewSet):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            serializer = FavoriteSerializer(
-                recipe,
-                data=request.data,
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            Favorite.objects.create(user=user, recipe=recipe)
+            try:
+                with transaction.atomic():
+                    Favorite.objects.create(user=user, recipe=recipe)
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        favorites_count=F('favorites_count') + 1
+                    )
+                    popularity_changed()
+            except IntegrityError:
+                return Response(
+                    {NON_FIELD_ERRORS_KEY: ['Рецепт уже есть в избранном!']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = RecipeShortSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if user.fan.filter(recipe=recipe).exists():
-                favorite = Favorite.objects.filter(user=user, recipe=recipe)
-                favorite.delete()
+            with transaction.atomic():
+                deleted, _ = Favorite.objects.filter(
+                    user=user,
+                    recipe=recipe
+                ).delete()
+                if deleted:
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        favorites_count=Greatest(
+                            F('favorites_count') - deleted, 0
+                        )
+                    )
+                    popularity_changed()
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response({'detail': 'Данного рецепта нет в избранном!'},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -117,57 +286,169 @@ class RecipeViewSet(ModelViewSet):
         user = request.user
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            serializer = ShoppingCartSerializer(
-                recipe,
-                data=request.data,
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            ShoppingCart.objects.create(user=user, recipe=recipe)
+            try:
+                with transaction.atomic():
+                    ShoppingCart.objects.create(user=user, recipe=recipe)
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        carts_count=F('carts_count') + 1
+                    )
+            except IntegrityError:
+                if not ShoppingCart.objects.filter(
+                    user=user, recipe=recipe
+                ).exists():
+                    raise
+                return Response(
+                    {NON_FIELD_ERRORS_KEY: [
+                        'Рецепт уже есть в списке покупок!'
+                    ]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = RecipeShortSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if user.carts.filter(recipe=recipe).exists():
-                shopping = ShoppingCart.objects.filter(
+            with transaction.atomic():
+                deleted, _ = ShoppingCart.objects.filter(
                     user=user,
                     recipe=recipe
-                )
-                shopping.delete()
+                ).delete()
+                if deleted:
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        carts_count=Greatest(
+                            F('carts_count') - deleted, 0
+                        )
+                    )
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'detail': 'Данного рецепта нет в списке покупок!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    @action(detail=False, permission_classes=(IsAuthenticated,))
-    def download_shopping_cart(self, request):
+    def create_relations(self, model, user, recipe_ids):
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    model(user=user, recipe_id=pk) for pk in recipe_ids
+                )
+            return recipe_ids
+        except IntegrityError:
+            pass
+        created = set()
+        for pk in recipe_ids:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        (model(user=user, recipe_id=pk),)
+                    )
+            except IntegrityError:
+                continue
+            created.add(pk)
+        return created
+
+    @transaction.atomic
+    def bulk_relation(self, request, model, counter, shopping_list=False):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
         user = request.user
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in_carts__user=user).values(
-                'ingredient__name',
-                'ingredient__measurement_unit').annotate(amount=Sum('amount'))
-        text = ''
-        for ingredient in ingredients:
-            text += (
-                f'•  {ingredient["ingredient__name"]}'
-                f'({ingredient["ingredient__measurement_unit"]})'
-                f'— {ingredient["amount"]}\n'
+        recipe_ids = set(
+            Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        relations = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+        if request.method == 'POST':
+            present = set(relations.values_list('recipe_id', flat=True))
+            changed = self.create_relations(model, user, recipe_ids - present)
+            delta, done, skipped = 1, 'added', 'exists'
+        else:
+            changed = set(relations.select_for_update(of=('self',)).order_by(
+                'pk'
+            ).values_list('recipe_id', flat=True))
+            delta, done, skipped = -1, 'removed', 'absent'
+            model.objects.filter(user=user, recipe_id__in=changed).delete()
+        if changed:
+            Recipe.objects.filter(pk__in=changed).update(
+                **{counter: Greatest(F(counter) + delta, 0)}
             )
-        response = HttpResponse(text, content_type='text/plain')
-        response.headers[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
+            if counter == 'favorites_count':
+                popularity_changed()
+            if shopping_list and delta > 0:
+                ShoppingListItem.objects.change(
+                    (user.id,),
+                    ShoppingListItem.objects.recipe_amounts(*changed)
+                )
+        return Response({
+            pk: done if pk in changed
+            else skipped if pk in recipe_ids
+            else 'not_found'
+            for pk in ids
+        })
+
+    @action(
+        methods=['post', 'delete', ],
+        detail=False,
+        url_path='favorite/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_relation(request, Favorite, 'favorites_count')
+
+    @action(
+        methods=['post', 'delete', ],
+        detail=False,
+        url_path='shopping_cart/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_relation(
+            request, ShoppingCart, 'carts_count', shopping_list=True
+        )
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            TxtShoppingCartRenderer,
+            CsvShoppingCartRenderer,
+            JsonShoppingCartRenderer,
+        )
+    )
+    def download_shopping_cart(self, request):
+        user = request.user
+        renderer = request.accepted_renderer
+        ingredients = ShoppingListItem.objects.filter(user=user).values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            amount=F('total_amount')
+        )
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator(
+                chunk_size=settings.SHOPPING_CART_CHUNK_SIZE
+            )),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response.headers['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
         return response
 
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(CachedCatalogMixin, ModelViewSet):
+    catalog_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ModelViewSet):
+class IngredientViewSet(CachedCatalogMixin, ModelViewSet):
+    catalog_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (NameFilter,)
-    search_fields = ('^name',)
     pagination_class = None
+
+
+class ProfilingView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(profiling_summary())
@@ -0,0 +1,30 @@
+from django.conf import settings
+
+from api import metrics
+
+
+class HealthCheckDatabaseWrapperMixin:
+    health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            if settings.DB_HEALTH_CHECKS and not self.is_usable():
+                metrics.inc(
+                    'foodgram_db_connections_dropped_total',
+                    {'vendor': self.vendor}
+                )
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,77 @@
+import queue
+import threading
+
+from django.conf import settings
+
+from api import metrics
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_pool(alias, size):
+    with _lock:
+        if alias not in _pools:
+            _pools[alias] = queue.LifoQueue(size)
+        return _pools[alias]
+
+
+def close_pool(alias):
+    with _lock:
+        pool = _pools.pop(alias, None)
+    while pool is not None:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+class PooledDatabaseWrapperMixin:
+    reused_connection = False
+
+    def get_pool(self):
+        size = self.settings_dict.get('POOL_SIZE', 0)
+        return get_pool(self.alias, size) if size else None
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        self.reused_connection = False
+        while pool is not None:
+            try:
+                connection = pool.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_pooled_connection_usable(connection):
+                metrics.inc('foodgram_db_pool_requests_total', {
+                    'alias': self.alias, 'result': 'hit'
+                })
+                self.reused_connection = True
+                return connection
+            connection.close()
+        if pool is not None:
+            metrics.inc('foodgram_db_pool_requests_total', {
+                'alias': self.alias, 'result': 'miss'
+            })
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        try:
+            self.reset_pooled_connection(self.connection)
+            pool.put_nowait(self.connection)
+        except (queue.Full, self.Database.Error):
+            return super()._close()
+
+    def is_pooled_connection_usable(self, connection):
+        if not settings.DB_HEALTH_CHECKS:
+            return True
+        try:
+            connection.cursor().execute('SELECT 1')
+        except self.Database.Error:
+            return False
+        return True
+
+    def reset_pooled_connection(self, connection):
+        raise NotImplementedError
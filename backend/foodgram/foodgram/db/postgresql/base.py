@@ -0,0 +1,20 @@
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ..health import HealthCheckDatabaseWrapperMixin
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(HealthCheckDatabaseWrapperMixin,
+                      PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def is_pooled_connection_usable(self, connection):
+        return not connection.closed and super().is_pooled_connection_usable(
+            connection
+        )
+
+    def reset_pooled_connection(self, connection):
+        if (
+            connection.get_transaction_status()
+            != extensions.TRANSACTION_STATUS_IDLE
+        ):
+            connection.rollback()
@@ -0,0 +1,11 @@
+from django.db.backends.sqlite3 import base
+
+from ..health import HealthCheckDatabaseWrapperMixin
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(HealthCheckDatabaseWrapperMixin,
+                      PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def reset_pooled_connection(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
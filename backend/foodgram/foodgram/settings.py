@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -63,16 +65,58 @@ DATABASES = {
     'default': {
         'ENGINE': os.getenv(
             'DB_ENGINE',
-            default='django.db.backends.postgresql'
+            default='foodgram.db.postgresql'
         ),
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', default=0)),
     }
 }
 
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', default='True') == 'True'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+SHARED_CACHE = CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+CATALOG_LOCAL_TIMEOUT = int(os.getenv('CATALOG_LOCAL_TIMEOUT', default=60))
+
+ANONYMOUS_CACHE_TIMEOUT = int(os.getenv('ANONYMOUS_CACHE_TIMEOUT', default=60))
+
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', default='False') == 'True'
+REQUEST_PROFILING_WINDOW = 500
+REQUEST_PROFILING_DUPLICATES = 3
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='True') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -108,9 +152,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -122,6 +165,11 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'users.User'
 
+TOKEN_CACHE_TIMEOUT = int(os.getenv(
+    'TOKEN_CACHE_TIMEOUT', default=60 if SHARED_CACHE else 0
+))
+TOKEN_CACHE_SIZE = 10000
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DJOSER = {
@@ -138,3 +186,17 @@ DJOSER = {
 
 MIN_VALIDATOR = 1
 MAX_VALIDATOR = 720
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+
+INGREDIENT_SEARCH_LIMIT = 20
+
+BULK_RECIPES_LIMIT = 100
+
+IMPORT_BATCH_SIZE = 1000
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_DECODE_CHUNK = 64 * 1024
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_FORMATS = ('WEBP', 'JPEG')
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingListItem, Tag)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -26,7 +26,7 @@ class RecipeAdmin(admin.ModelAdmin):
     readonly_fields = ('favorites',)
 
     def favorites(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -42,8 +42,13 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe',)
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'total_amount',)
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
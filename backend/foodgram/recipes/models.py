@@ -1,9 +1,15 @@
+from collections import defaultdict
+
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
 
 from users.models import User
 
+from .storage import ContentHashStorage
+
 
 class Tag(models.Model):
     name = models.TextField(
@@ -46,8 +52,15 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/images/',
+        storage=ContentHashStorage(),
         blank=True
     )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
             MinValueValidator(settings.MIN_VALIDATOR),
@@ -59,15 +72,35 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В списках покупок'
+    )
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = (
+            models.Index(fields=('-pub_date', '-id')),
+            models.Index(fields=('-favorites_count', '-pub_date')),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -87,7 +120,12 @@ class Favorite(models.Model):
         ordering = ('-recipe_id', )
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
-        unique_together = ('user', 'recipe')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite'
+            ),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -108,7 +146,12 @@ class ShoppingCart(models.Model):
         ordering = ('-recipe_id', )
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
-        unique_together = ('user', 'recipe')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart'
+            ),
+        )
 
 
 class Ingredient(models.Model):
@@ -117,6 +160,13 @@ class Ingredient(models.Model):
         max_length=200,
         verbose_name='Единица измерения'
     )
+    search_name = models.CharField(
+        max_length=200,
+        db_index=True,
+        default='',
+        editable=False,
+        verbose_name='Название для поиска'
+    )
 
     class Meta:
         ordering = ('name', )
@@ -126,6 +176,10 @@ class Ingredient(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = self.name.lower()
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -150,3 +204,117 @@ class RecipeIngredient(models.Model):
         ordering = ('-recipe_id', )
         verbose_name = 'РецептИнгредиент'
         verbose_name_plural = 'РецептыИнгредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'
+            ),
+        )
+
+
+class ShoppingListItemManager(models.Manager):
+
+    def recipe_amounts(self, *recipes, sign=1):
+        amounts = defaultdict(int)
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] += sign * amount
+        return amounts
+
+    def change(self, user_ids, amounts, attempts=3):
+        user_ids = set(user_ids)
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    self.apply_change(user_ids, amounts)
+                return
+            except IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+
+    def apply_change(self, user_ids, amounts):
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update(of=('self',)).filter(
+                user_id__in=user_ids,
+                ingredient_id__in=amounts
+            ).order_by('pk')
+        }
+        new_items, changed_items, empty_items = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, amount in amounts.items():
+                item = items.get((user_id, ingredient_id))
+                if item is None:
+                    if amount > 0:
+                        new_items.append(self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=amount
+                        ))
+                    continue
+                item.total_amount += amount
+                if item.total_amount > 0:
+                    changed_items.append(item)
+                else:
+                    empty_items.append(item.pk)
+        self.bulk_create(new_items)
+        self.bulk_update(changed_items, ('total_amount',))
+        self.filter(pk__in=empty_items).delete()
+
+    def live(self, user_ids=None):
+        carts = {'recipe__in_carts__isnull': False}
+        if user_ids is not None:
+            carts = {'recipe__in_carts__user_id__in': user_ids}
+        return RecipeIngredient.objects.filter(**carts).values(
+            'ingredient_id',
+            user_id=F('recipe__in_carts__user_id')
+        ).annotate(total_amount=Sum('amount')).order_by()
+
+    @transaction.atomic
+    def rebuild(self, user_ids=None, batch_size=1000):
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        self.bulk_create(
+            (self.model(**item) for item in self.live(user_ids)),
+            batch_size=batch_size
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        ordering = ('ingredient__name', )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )